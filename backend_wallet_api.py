@@ -1,61 +1,142 @@
+import os
+import asyncio
 import uvicorn
 import time
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+import itertools
+import hashlib
+import threading
+import contextlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, AsyncContextManager
 
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, Field
 
+import orjson
+from cachetools import TTLCache
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+import jwt
+from jwt import InvalidTokenError
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Only needed when REDIS_URL is set
+    aioredis = None
 
 # --- 1. CONFIGURATION AND CONSTANTS ---
 
 # Initial balance for new users
-INITIAL_BALANCE = 100.00
+# Balances are stored internally as integer cents (paise) to avoid float drift
+INITIAL_BALANCE_CENTS = 10000
+INITIAL_BALANCE = INITIAL_BALANCE_CENTS / 100
+# Upper bound for a single spend; keeps amount * 100 finite when converting to cents
+MAX_SPEND_AMOUNT = 1_000_000_000.00
 
 # JWT Configuration
 SECRET_KEY = "super-secret-key-do-not-use-in-production-12345"  # Replace this!
 ALGORITHM = "HS256"
+# Encode/decode arguments built once instead of on every request
+_JWT_KEY = SECRET_KEY.encode()
+_JWT_ALGORITHMS = (ALGORITHM,)
+_JWT_DECODE_OPTIONS = {"require": ["exp", "sub"], "verify_signature": True}
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+_ACCESS_TOKEN_TTL_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Verified tokens are cached briefly (keyed by token hash) to skip re-decoding on every request.
+AUTH_CACHE_TTL_SECONDS = 30
+_auth_cache: TTLCache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
 
 # Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Each bcrypt round doubles the cost; 10 is ~4x cheaper than passlib's default of 12.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Successful password checks are remembered briefly so repeat logins skip bcrypt.
+# The key includes the stored hash, so a password change invalidates it.
+# Hits are checked on the event loop; only verify_password (run in the threadpool) writes,
+# so the lock guards writes between threads.
+_verify_cache: TTLCache = TTLCache(maxsize=5000, ttl=60)
+_verify_cache_lock = threading.Lock()
+
+# Optional Redis storage. When REDIS_URL is set (e.g. redis://localhost:6379/0), users,
+# balances and transactions are kept in Redis so multiple workers share state and data
+# survives restarts. Otherwise the in-memory stores below are used.
+REDIS_URL = os.getenv("REDIS_URL")
 
 # --- 2. IN-MEMORY DATABASE (Simplified) ---
 # NOTE: In a real application, replace these with a proper SQLAlchemy/Postgres ORM setup.
 
-users_db: List[Dict[str, Any]] = []
-items_db: List[Dict[str, Any]] = []
-transactions_db: List[Dict[str, Any]] = []
+# Records are indexed by primary key (and users also by username) so lookups are O(1).
+users_by_id: Dict[int, Dict[str, Any]] = {}
+users_by_username: Dict[str, Dict[str, Any]] = {}
+items_by_id: Dict[int, Dict[str, Any]] = {}
+transactions_by_id: Dict[int, Dict[str, Any]] = {}
+# Per-user transaction history, in insertion order
+transactions_by_user: Dict[int, List[Dict[str, Any]]] = {}
+
+# Per-user locks serializing balance check + update + transaction record (created lazily).
+# Only used with in-memory storage; Redis balance updates are atomic on the server.
+_user_locks: Dict[int, asyncio.Lock] = {}
+
+# Next primary key to hand out for each store: next(counter) is O(1) and, being a single
+# C-level call, safe under the GIL. Redis storage uses INCR counters instead.
+_next_user_id = itertools.count(1)
+_next_item_id = itertools.count(1)
+_next_tx_id = itertools.count(1)
+
+# --- 2b. REDIS DATABASE (Optional) ---
+# Layout: "user:{id}" hashes, a "user:by_username" hash (username -> id), "next_user_id" and
+# "next_tx_id" counters, and "transactions" / "user:{id}:transactions" lists of JSON records.
+# Items are static seed data and always stay in memory.
+
+redis_client = None
+if REDIS_URL:
+    if aioredis is None:
+        raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed (pip install redis).")
+    redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+# Applies a balance delta atomically, refusing to go below zero.
+# Returns the new balance, -1 if the user does not exist, or -2 on insufficient funds.
+_UPDATE_BALANCE_LUA = """
+local balance = redis.call('HGET', KEYS[1], 'balance_cents')
+if not balance then
+    return -1
+end
+local new_balance = tonumber(balance) + tonumber(ARGV[1])
+if new_balance < 0 then
+    return -2
+end
+redis.call('HSET', KEYS[1], 'balance_cents', new_balance)
+return new_balance
+"""
+_update_balance_script = redis_client.register_script(_UPDATE_BALANCE_LUA) if redis_client is not None else None
 
 # --- 3. SEED DATA ---
 
-def get_next_id(db: List[Dict[str, Any]]) -> int:
-    """Helper to get the next unique ID for an in-memory list."""
-    if not db:
-        return 1
-    return max(item['id'] for item in db) + 1
-
 def seed_data():
     """Populates the items database with initial items."""
     print("Seeding initial items...")
-    global items_db
-    items_db = [
-        {"id": 1, "name": "The Great Gatsby (Book)", "price": 50.00},
-        {"id": 2, "name": "Coffee Mug", "price": 25.50},
-        {"id": 3, "name": "Notebook (Premium)", "price": 10.00},
-        {"id": 4, "name": "Mystery Box (Low Risk)", "price": 49.99},
-        {"id": 5, "name": "Pen Set (Ballpoint)", "price": 15.00},
-    ]
-    print(f"Seeded {len(items_db)} items.")
+    for name, price in [
+        ("The Great Gatsby (Book)", 50.00),
+        ("Coffee Mug", 25.50),
+        ("Notebook (Premium)", 10.00),
+        ("Mystery Box (Low Risk)", 49.99),
+        ("Pen Set (Ballpoint)", 15.00),
+    ]:
+        item_id = next(_next_item_id)
+        items_by_id[item_id] = {"id": item_id, "name": name, "price": price}
+    print(f"Seeded {len(items_by_id)} items.")
 
 seed_data()
 
 # --- 4. PYDANTIC SCHEMAS ---
 
 # Models for Request and Response Data
+# BalanceResponse is filled from the app's own records, so it is built with model_construct() (no validation).
 class UserBase(BaseModel):
     username: str
 
@@ -71,16 +152,16 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-class TokenData(BaseModel):
-    username: Optional[str] = None
-
 class BalanceResponse(BaseModel):
     user_id: int
     username: str
     balance: float
 
 class SpendRequest(BaseModel):
-    amount: float = Field(..., gt=0, description="Amount to spend, must be greater than zero.")
+    amount: float = Field(
+        ..., gt=0, le=MAX_SPEND_AMOUNT, allow_inf_nan=False,
+        description="Amount to spend, must be greater than zero."
+    )
     description: str = Field("General Spend", description="Description for the transaction.")
 
 class Item(BaseModel):
@@ -100,9 +181,23 @@ class Transaction(BaseModel):
 # --- 5. SECURITY UTILITIES (Password & JWT) ---
 
 # Password Utilities
+def _verify_cache_key(plain_password, hashed_password) -> bytes:
+    """Builds the _verify_cache key for a password/hash pair."""
+    return hashlib.sha256(f"{hashed_password}:{plain_password}".encode()).digest()
+
+def is_password_verified_recently(plain_password, hashed_password) -> bool:
+    """Returns True if this password matched this hash within the cache TTL (no bcrypt)."""
+    return _verify_cache_key(plain_password, hashed_password) in _verify_cache
+
 def verify_password(plain_password, hashed_password):
     """Checks if the plain password matches the hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    cache_key = _verify_cache_key(plain_password, hashed_password)
+    verified = pwd_context.verify(plain_password, hashed_password)
+    # Only positive results are cached, so failed guesses always pay the full bcrypt cost
+    if verified:
+        with _verify_cache_lock:
+            _verify_cache[cache_key] = True
+    return verified
 
 def get_password_hash(password):
     """Hashes the plain password."""
@@ -114,45 +209,89 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Creates a JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # Integer epoch seconds are a valid "exp" claim and skip datetime arithmetic
+    ttl_seconds = int(expires_delta.total_seconds()) if expires_delta else _ACCESS_TOKEN_TTL_SECONDS
+    to_encode["exp"] = int(time.time()) + ttl_seconds
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 # --- 6. USER/WALLET/DATABASE SERVICE FUNCTIONS ---
 
-def get_user(username: str) -> Optional[Dict[str, Any]]:
+def _user_from_redis(data: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Converts a Redis user hash (all string values) back into a user dictionary."""
+    if not data:
+        return None
+    return {
+        "id": int(data["id"]),
+        "username": data["username"],
+        "hashed_password": data["hashed_password"],
+        "balance_cents": int(data["balance_cents"]),
+    }
+
+async def get_user(username: str) -> Optional[Dict[str, Any]]:
     """Retrieves a user dictionary by username."""
-    return next((user for user in users_db if user["username"] == username), None)
+    if redis_client is not None:
+        user_id = await redis_client.hget("user:by_username", username)
+        return await get_user_by_id(int(user_id)) if user_id else None
+    return users_by_username.get(username)
 
-def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
+async def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
     """Retrieves a user dictionary by ID."""
-    return next((user for user in users_db if user["id"] == user_id), None)
-
-def create_user_record(user: UserCreate) -> Dict[str, Any]:
+    if redis_client is not None:
+        return _user_from_redis(await redis_client.hgetall(f"user:{user_id}"))
+    return users_by_id.get(user_id)
+
+async def list_users() -> List[Dict[str, Any]]:
+    """Retrieves all user dictionaries, ordered by ID."""
+    if redis_client is not None:
+        user_ids = sorted(int(i) for i in await redis_client.hvals("user:by_username"))
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(f"user:{user_id}")
+            users = [_user_from_redis(data) for data in await pipe.execute()]
+        # Defensive: skip any claimed name whose user hash has gone missing
+        return [user for user in users if user is not None]
+    return list(users_by_id.values())
+
+async def create_user_record(user: UserCreate) -> Dict[str, Any]:
     """Creates a new user, hashes password, sets initial balance, and stores in DB."""
-    if get_user(user.username):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
+    username_taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Username already registered"
+    )
+    if await get_user(user.username):
+        raise username_taken
     
-    hashed_password = get_password_hash(user.password)
-    user_id = get_next_id(users_db)
+    # bcrypt is CPU-bound, so hash in the threadpool to keep the event loop free
+    hashed_password = await run_in_threadpool(get_password_hash, user.password)
+
+    if redis_client is not None:
+        user_id = await redis_client.incr("next_user_id")
+    else:
+        # Another request may have registered the same name while we were hashing
+        if await get_user(user.username):
+            raise username_taken
+        user_id = next(_next_user_id)
     
     new_user = {
         "id": user_id,
         "username": user.username,
         "hashed_password": hashed_password,
-        "balance": INITIAL_BALANCE,
+        "balance_cents": INITIAL_BALANCE_CENTS,
     }
-    users_db.append(new_user)
+    if redis_client is not None:
+        # Write the user hash first (the id is unique), then claim the username atomically
+        # with HSETNX. A hash left behind by a failed claim is unreachable, never a dead name.
+        await redis_client.hset(f"user:{user_id}", mapping=new_user)
+        if not await redis_client.hsetnx("user:by_username", user.username, user_id):
+            await redis_client.delete(f"user:{user_id}")
+            raise username_taken
+    else:
+        users_by_id[user_id] = new_user
+        users_by_username[user.username] = new_user
     
     # Record initial balance transaction
-    record_transaction(
+    await record_transaction(
         user_id=user_id,
         amount=INITIAL_BALANCE,
         type="REGISTER",
@@ -162,38 +301,94 @@ def create_user_record(user: UserCreate) -> Dict[str, Any]:
     
     return new_user
 
-def record_transaction(user_id: int, amount: float, type: str, description: str, item_id: Optional[int]):
+async def record_transaction(user_id: int, amount: float, type: str, description: str, item_id: Optional[int]):
     """Records a new transaction."""
-    transaction_id = get_next_id(transactions_db)
+    if redis_client is not None:
+        transaction_id = await redis_client.incr("next_tx_id")
+    else:
+        transaction_id = next(_next_tx_id)
     new_transaction = {
         "id": transaction_id,
         "user_id": user_id,
-        "timestamp": datetime.now(),
+        "timestamp": datetime.now(timezone.utc),
         "type": type,
         "amount": amount,
         "description": description,
         "item_id": item_id
     }
-    transactions_db.append(new_transaction)
+    if redis_client is not None:
+        record = orjson.dumps(new_transaction)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush("transactions", record)
+            pipe.rpush(f"user:{user_id}:transactions", record)
+            await pipe.execute()
+    else:
+        transactions_by_id[transaction_id] = new_transaction
+        transactions_by_user.setdefault(user_id, []).append(new_transaction)
     return new_transaction
 
-def update_user_balance(user_id: int, amount: float, operation: str):
+async def list_transactions(user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Retrieves all transactions, or only one user's if user_id is given, oldest first."""
+    if redis_client is not None:
+        key = "transactions" if user_id is None else f"user:{user_id}:transactions"
+        return [orjson.loads(record) for record in await redis_client.lrange(key, 0, -1)]
+    if user_id is None:
+        return list(transactions_by_id.values())
+    return transactions_by_user.get(user_id, [])
+
+@contextlib.asynccontextmanager
+async def _no_lock():
+    """Async context manager that guards nothing."""
+    yield
+
+def get_user_lock(user_id: int) -> AsyncContextManager:
+    """Returns the lock guarding a user's wallet, creating it on first use.
+
+    With Redis storage the balance update is already atomic on the server (and a
+    process-local lock would not cover other workers), so no lock is taken.
+    """
+    if redis_client is not None:
+        return _no_lock()
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+def to_cents(amount: float) -> int:
+    """Converts a currency amount to integer cents."""
+    return int(round(amount * 100))
+
+def from_cents(cents: int) -> float:
+    """Converts integer cents back to a currency amount for responses."""
+    return cents / 100
+
+async def update_user_balance(user_id: int, amount: float, operation: str):
     """Updates the user's balance based on an operation ('ADD' or 'SUBTRACT')."""
-    user = get_user_by_id(user_id)
+    amount_cents = to_cents(amount)
+    if amount_cents <= 0:
+        # Sub-cent amounts would round to zero and leave the ledger out of step with the balance
+        raise HTTPException(status_code=400, detail="Amount must be at least 0.01.")
+    if redis_client is not None:
+        delta = {'SUBTRACT': -amount_cents, 'ADD': amount_cents}.get(operation, 0)
+        new_balance_cents = await _update_balance_script(keys=[f"user:{user_id}"], args=[delta])
+        if new_balance_cents == -1:
+            raise HTTPException(status_code=404, detail="User not found")
+        if new_balance_cents == -2:
+            raise HTTPException(status_code=400, detail="Insufficient funds in wallet.")
+        return from_cents(new_balance_cents)
+
+    user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
     if operation == 'SUBTRACT':
-        if user['balance'] < amount:
+        if user['balance_cents'] < amount_cents:
             raise HTTPException(status_code=400, detail="Insufficient funds in wallet.")
-        user['balance'] -= amount
+        user['balance_cents'] -= amount_cents
     elif operation == 'ADD':
-        user['balance'] += amount
-    
-    # Round balance to 2 decimal places after operation
-    user['balance'] = round(user['balance'], 2)
+        user['balance_cents'] += amount_cents
 
-    return user['balance']
+    return from_cents(user['balance_cents'])
 
 # --- 7. DEPENDENCIES ---
 
@@ -204,19 +399,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cache_key = hashlib.sha256(token.encode()).hexdigest()[:32]
+    cached = _auth_cache.get(cache_key)
+    if cached is not None:
+        user, expires_at = cached
+        # Never serve a cached user past the token's own expiry
+        if expires_at > time.time():
+            return user
+        _auth_cache.pop(cache_key, None)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+        payload = jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_DECODE_OPTIONS)
+        # "sub" is guaranteed present by the decode options' "require" list
+        username: str = payload["sub"]
+    except InvalidTokenError:
         raise credentials_exception
         
-    user = get_user(token_data.username)
+    user = await get_user(username)
     if user is None:
         raise credentials_exception
-    
+
+    _auth_cache[cache_key] = (user, payload["exp"])
+
     # Return the full user dictionary
     return user
 
@@ -225,17 +429,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 app = FastAPI(
     title="Virtual Wallet FastAPI Backend",
     description="A simple API for user authentication, a virtual wallet (starting balance ₹100), and an item purchasing system.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Compress larger responses (mainly the list endpoints) for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # --- 9. ENDPOINTS (ROUTERS) ---
 
 # --- AUTH ROUTER ---
 @app.post("/auth/register", response_model=UserBase, status_code=status.HTTP_201_CREATED, tags=["Auth"])
-def register_user(user: UserCreate):
+async def register_user(user: UserCreate):
     """Registers a new user and grants them the initial ₹100 balance."""
     try:
-        new_user = create_user_record(user)
+        new_user = await create_user_record(user)
         return new_user
     except HTTPException as e:
         raise e
@@ -243,69 +451,81 @@ def register_user(user: UserCreate):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Registration failed.")
 
 @app.post("/auth/login", response_model=Token, tags=["Auth"])
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Logs in a user and returns an access token."""
-    user = get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    user = await get_user(form_data.username)
+    verified = user is not None and (
+        # Recently verified logins skip both bcrypt and the threadpool handoff
+        is_password_verified_recently(form_data.password, user["hashed_password"])
+        or await run_in_threadpool(verify_password, form_data.password, user["hashed_password"])
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["username"]}, expires_delta=access_token_expires
-    )
+    access_token = create_access_token(data={"sub": user["username"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # --- WALLET ROUTER ---
 @app.get("/wallet/balance", response_model=BalanceResponse, tags=["Wallet"])
-def get_balance(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_balance(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Retrieves the current balance of the authenticated user's wallet."""
-    return BalanceResponse(
-        user_id=current_user["id"],
-        username=current_user["username"],
-        balance=current_user["balance"]
+    user = current_user
+    if redis_client is not None:
+        # The cached auth result is a snapshot in Redis mode, so re-read the live balance
+        user = await get_user_by_id(current_user["id"]) or current_user
+    return BalanceResponse.model_construct(
+        user_id=user["id"],
+        username=user["username"],
+        balance=from_cents(user["balance_cents"])
     )
 
 @app.post("/wallet/spend", response_model=BalanceResponse, tags=["Wallet"])
-def spend_money(
+async def spend_money(
     spend_data: SpendRequest,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Deducts an arbitrary amount from the user's wallet."""
     user_id = current_user["id"]
     
-    try:
-        new_balance = update_user_balance(user_id, spend_data.amount, 'SUBTRACT')
-    except HTTPException as e:
-        raise e
-        
-    # Record the transaction
-    record_transaction(
-        user_id=user_id,
-        amount=spend_data.amount,
-        type="SPEND",
-        description=spend_data.description,
-        item_id=None
-    )
+    async with get_user_lock(user_id):
+        try:
+            new_balance = await update_user_balance(user_id, spend_data.amount, 'SUBTRACT')
+        except HTTPException as e:
+            raise e
+            
+        # Record the transaction with the amount actually applied (whole cents)
+        await record_transaction(
+            user_id=user_id,
+            amount=from_cents(to_cents(spend_data.amount)),
+            type="SPEND",
+            description=spend_data.description,
+            item_id=None
+        )
     
-    return BalanceResponse(
+    return BalanceResponse.model_construct(
         user_id=user_id,
         username=current_user["username"],
         balance=new_balance
     )
 
+@app.get("/wallet/history", response_model=List[Transaction], tags=["Wallet"])
+async def get_wallet_history(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Lists the authenticated user's own transactions, oldest first."""
+    # Stored records already match the Transaction schema, so skip response_model re-validation
+    return ORJSONResponse(await list_transactions(current_user["id"]))
+
 # --- ITEMS ROUTER ---
 @app.get("/items/list", response_model=List[Item], tags=["Items"])
-def list_items():
+async def list_items():
     """Lists all available items for purchase."""
-    # Convert item dicts to Pydantic models for clean response
-    return [Item(**i) for i in items_db]
+    return ORJSONResponse(list(items_by_id.values()))
 
 @app.post("/items/buy/{item_id}", response_model=BalanceResponse, tags=["Items"])
-def buy_item(
+async def buy_item(
     item_id: int,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
@@ -313,30 +533,31 @@ def buy_item(
     user_id = current_user["id"]
     
     # 1. Find the item
-    item = next((i for i in items_db if i["id"] == item_id), None)
+    item = items_by_id.get(item_id)
     if not item:
         raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found.")
         
     item_price = item["price"]
     
-    # 2. Check balance and update
-    try:
-        # Subtract the item price from the user's balance
-        new_balance = update_user_balance(user_id, item_price, 'SUBTRACT')
-    except HTTPException as e:
-        # Re-raise Insufficient funds error
-        raise e
-    
-    # 3. Record transaction
-    record_transaction(
-        user_id=user_id,
-        amount=item_price,
-        type="BUY",
-        description=f"Purchased: {item['name']}",
-        item_id=item_id
-    )
+    async with get_user_lock(user_id):
+        # 2. Check balance and update
+        try:
+            # Subtract the item price from the user's balance
+            new_balance = await update_user_balance(user_id, item_price, 'SUBTRACT')
+        except HTTPException as e:
+            # Re-raise Insufficient funds error
+            raise e
+        
+        # 3. Record transaction
+        await record_transaction(
+            user_id=user_id,
+            amount=item_price,
+            type="BUY",
+            description=f"Purchased: {item['name']}",
+            item_id=item_id
+        )
 
-    return BalanceResponse(
+    return BalanceResponse.model_construct(
         user_id=user_id,
         username=current_user["username"],
         balance=new_balance
@@ -344,26 +565,41 @@ def buy_item(
 
 # --- ADMIN/DEBUG ROUTER (Optional but helpful for development) ---
 @app.get("/transactions", response_model=List[Transaction], tags=["Admin/Debug"], description="List all transactions (for all users, requires no auth in this simple version)")
-def get_all_transactions():
+async def get_all_transactions():
     """Retrieves all transactions recorded in the system."""
     # Note: In a real app, this would require ADMIN authentication
-    return [Transaction(**t) for t in transactions_db]
+    return ORJSONResponse(await list_transactions())
 
 @app.get("/users", response_model=List[UserInDB], tags=["Admin/Debug"], description="List all users (for all users, requires no auth in this simple version)")
-def get_all_users():
+async def get_all_users():
     """Retrieves all user records."""
     # Note: In a real app, this would require ADMIN authentication
-    # We create a temporary list of Pydantic objects before returning
+    # Build plain dicts in the UserInDB shape and return them without response_model re-validation
     users_list = []
-    for user in users_db:
+    for user in await list_users():
         # Exclude hashed_password from the response for security in a real endpoint, but include here for debugging simplicity
-        users_list.append(UserInDB(**user))
-    return users_list
+        users_list.append({
+            "username": user["username"],
+            "id": user["id"],
+            "hashed_password": user["hashed_password"],
+            "balance": from_cents(user["balance_cents"]),
+        })
+    return ORJSONResponse(users_list)
 
 # --- 10. RUNNER ---
 if __name__ == "__main__":
-    # Ensure uvicorn is installed (pip install uvicorn)
-    # The --reload flag is for development convenience
+    # Ensure uvicorn is installed (pip install "uvicorn[standard]" for uvloop/httptools)
     print(f"Starting FastAPI server on http://127.0.0.1:8000")
     print(f"Initial balance for new users: ₹{INITIAL_BALANCE}")
-    uvicorn.run("backend_wallet_api:app", host="0.0.0.0", port=8000, reload=True)
+    if os.getenv("DEV_MODE", "1") == "1":
+        # The reload flag is for development convenience (single worker only)
+        uvicorn.run("backend_wallet_api:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        if workers > 1 and redis_client is None:
+            # Each worker process gets its own copy of the in-memory database
+            print(f"WARNING: running {workers} workers with in-memory storage; users, balances "
+                  "and transactions will NOT be shared between workers.")
+        # "auto" picks uvloop/httptools when installed and falls back to asyncio/h11 otherwise
+        uvicorn.run("backend_wallet_api:app", host="0.0.0.0", port=8000,
+                    workers=workers, loop="auto", http="auto")
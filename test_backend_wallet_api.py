@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import os
+import time
+from datetime import datetime, timedelta
+
+# Keep bcrypt cheap in tests; must be set before the app module is imported
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+import jwt.api_jwt
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import backend_wallet_api as api
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture(params=["memory", "redis"])
+def client(request, monkeypatch):
+    """A TestClient over fresh app state, backed by in-memory storage or (fake) Redis."""
+    for store in (api.users_by_id, api.users_by_username, api.transactions_by_id,
+                  api.transactions_by_user, api._user_locks, api._auth_cache, api._verify_cache):
+        store.clear()
+    monkeypatch.setattr(api, "_next_user_id", itertools.count(1))
+    monkeypatch.setattr(api, "_next_tx_id", itertools.count(1))
+
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")  # fakeredis needs it to run the balance Lua script
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        monkeypatch.setattr(api, "redis_client", redis_client)
+        monkeypatch.setattr(api, "_update_balance_script", redis_client.register_script(api._UPDATE_BALANCE_LUA))
+
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+
+def advance_clock(monkeypatch, seconds):
+    """Moves wall-clock time forward for both the app and PyJWT's expiry check."""
+    real_time = time.time
+
+    class _LaterDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(seconds=seconds)
+
+    monkeypatch.setattr(api.time, "time", lambda: real_time() + seconds)
+    monkeypatch.setattr(jwt.api_jwt, "datetime", _LaterDatetime)
+
+
+def register_and_login(client, username="alice"):
+    """Registers a user and returns Authorization headers for them."""
+    assert client.post("/auth/register", json={"username": username, "password": PASSWORD}).status_code == 201
+    response = client.post("/auth/login", data={"username": username, "password": PASSWORD})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_spend_and_buy_update_balance_and_history(client):
+    headers = register_and_login(client)
+
+    assert client.post("/items/buy/1", headers=headers).json()["balance"] == 50.0
+    assert client.post("/wallet/spend", headers=headers, json={"amount": 20.5}).json()["balance"] == 29.5
+    assert client.get("/wallet/balance", headers=headers).json()["balance"] == 29.5
+
+    history = client.get("/wallet/history", headers=headers).json()
+    assert [(t["type"], t["amount"]) for t in history] == [("REGISTER", 100.0), ("BUY", 50.0), ("SPEND", 20.5)]
+
+
+def test_insufficient_funds_leaves_balance_and_ledger_unchanged(client):
+    headers = register_and_login(client)
+
+    response = client.post("/wallet/spend", headers=headers, json={"amount": 100.01})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient funds in wallet."
+
+    client.post("/items/buy/1", headers=headers)
+    client.post("/items/buy/4", headers=headers)  # 100.00 - 50.00 - 49.99 = 0.01 left
+    assert client.post("/items/buy/3", headers=headers).status_code == 400
+
+    assert client.get("/wallet/balance", headers=headers).json()["balance"] == 0.01
+    assert [t["type"] for t in client.get("/wallet/history", headers=headers).json()] == ["REGISTER", "BUY", "BUY"]
+
+
+def test_sub_cent_spend_is_rejected(client):
+    headers = register_and_login(client)
+
+    assert client.post("/wallet/spend", headers=headers, json={"amount": 0.004}).status_code == 400
+    assert client.post("/wallet/spend", headers=headers, json={"amount": 1.006}).json()["balance"] == 98.99
+    assert [t["amount"] for t in client.get("/wallet/history", headers=headers).json()] == [100.0, 1.01]
+
+
+@pytest.mark.parametrize("amount", ["inf", "nan", 1e307])
+def test_non_finite_or_huge_spend_is_rejected(client, amount):
+    headers = register_and_login(client)
+
+    assert client.post("/wallet/spend", headers=headers, json={"amount": amount}).status_code == 422
+    assert client.get("/wallet/balance", headers=headers).json()["balance"] == 100.0
+
+
+def test_duplicate_username_is_rejected(client):
+    register_and_login(client)
+    response = client.post("/auth/register", json={"username": "alice", "password": PASSWORD})
+    assert response.status_code == 400
+
+
+def test_duplicate_username_race_registers_only_once(client):
+    async def register_twice():
+        # Both calls pass the early username check before either finishes hashing
+        user = api.UserCreate(username="alice", password=PASSWORD)
+        return await asyncio.gather(api.create_user_record(user), api.create_user_record(user),
+                                    return_exceptions=True)
+
+    results = client.portal.call(register_twice)
+
+    errors = [r for r in results if isinstance(r, HTTPException)]
+    assert len(errors) == 1 and errors[0].status_code == 400
+    assert [u["username"] for u in client.get("/users").json()] == ["alice"]
+    assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 200
+    assert len(client.get("/transactions").json()) == 1
+
+
+def test_expired_token_is_not_served_from_auth_cache(client, monkeypatch):
+    headers = register_and_login(client)
+
+    assert client.get("/wallet/balance", headers=headers).status_code == 200
+    assert len(api._auth_cache) == 1
+
+    # Past the token's own expiry; the cache entry itself is still within its TTL
+    advance_clock(monkeypatch, api.ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 1)
+    assert len(api._auth_cache) == 1
+    assert client.get("/wallet/balance", headers=headers).status_code == 401
+
+
+def test_wallet_history_only_lists_the_callers_transactions(client):
+    alice = register_and_login(client, "alice")
+    bob = register_and_login(client, "bob")
+
+    client.post("/items/buy/2", headers=alice)
+    client.post("/wallet/spend", headers=bob, json={"amount": 5, "description": "Snack"})
+
+    alice_history = client.get("/wallet/history", headers=alice).json()
+    bob_history = client.get("/wallet/history", headers=bob).json()
+    assert [(t["type"], t["amount"]) for t in alice_history] == [("REGISTER", 100.0), ("BUY", 25.5)]
+    assert [(t["type"], t["description"]) for t in bob_history] == [("REGISTER", "Initial Wallet Setup"), ("SPEND", "Snack")]
+    assert {t["user_id"] for t in alice_history} != {t["user_id"] for t in bob_history}
+    assert len(client.get("/transactions").json()) == 4
+
+
+def test_repeat_login_is_served_from_verify_cache_without_threadpool(client, monkeypatch):
+    register_and_login(client)  # first login runs bcrypt and caches the success
+    offloaded = []
+    real_run_in_threadpool = api.run_in_threadpool
+
+    async def spy_run_in_threadpool(func, *args, **kwargs):
+        offloaded.append(func.__name__)
+        return await real_run_in_threadpool(func, *args, **kwargs)
+
+    monkeypatch.setattr(api, "run_in_threadpool", spy_run_in_threadpool)
+
+    assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 200
+    assert offloaded == []
+
+    # Failures are never cached, so each wrong guess still goes through bcrypt in the threadpool
+    for _ in range(2):
+        assert client.post("/auth/login", data={"username": "alice", "password": "wrong-password"}).status_code == 401
+    assert offloaded == ["verify_password", "verify_password"]
+
+
+def test_token_without_exp_is_rejected(client):
+    register_and_login(client)
+    token = api.jwt.encode({"sub": "alice"}, api._JWT_KEY, algorithm=api.ALGORITHM)
+    assert client.get("/wallet/balance", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_large_responses_are_gzipped(client):
+    headers = register_and_login(client)
+    for _ in range(20):
+        client.post("/wallet/spend", headers=headers, json={"amount": 0.01, "description": "Coffee top-up"})
+
+    response = client.get("/transactions", headers={"Accept-Encoding": "gzip"})
+    assert int(response.headers["content-length"]) < len(response.content)  # body was decompressed by the client
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 21
+
+    # Small responses stay uncompressed
+    assert "content-encoding" not in client.get("/items/list", headers={"Accept-Encoding": "gzip"}).headers